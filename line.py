@@ -1,55 +1,108 @@
 from decimal import Decimal, getcontext
 
+import numpy as np
+
 from vector import Vector
 
 getcontext().prec = 30
 
 
 class Line(object):
-
-    def __init__(self, normal_vector=None, constant_term=None):
+    """
+    Create a line. Coordinates are floats unless exact=True, or the
+    normal vector is a Decimal vector, in which case they are Decimals.
+
+    >>> l = Line(Vector([1, 2]), 3)
+    >>> l
+    Line(Vector([1, 2]), 3.0)
+    >>> l.includes_point([3, 0]), l.includes_point([3, 1])
+    (True, False)
+
+    >>> l = Line(Vector([1, 2]), 3, exact=True)
+    >>> l
+    Line(Vector([1, 2]), 3, exact=True)
+    >>> l.basepoint
+    Vector(['3', '0'], type=Decimal)
+    >>> l.includes_point([3, 0]), l.includes_point([3, 1])
+    (True, False)
+
+    >>> Line(Vector(['1', '2'], type=Decimal), '3')
+    Line(Vector(['1', '2'], type=Decimal), 3, exact=True)
+    >>> eval(repr(l)).type
+    <class 'decimal.Decimal'>
+
+    The printed form is cached, and rebuilt when the line is re-derived
+    after a change.
+
+    >>> l = Line(Vector([1, 2]), 3)
+    >>> print(l)
+    x_1 + 2x_2 = 3
+    >>> l.constant_term = 5.0
+    >>> l.set_basepoint()
+    >>> print(l)
+    x_1 + 2x_2 = 5
+    """
+
+    def __init__(self, normal_vector=None, constant_term=None, exact=None):
         self.dimension = 2
+        # Plain floats are plenty for 2-D predicates at Vector.TOLERANCE;
+        # exact=True keeps the slower 30-digit Decimal arithmetic.
+        if exact is None:
+            exact = normal_vector is not None and normal_vector.type is Decimal
+        self.type = Decimal if exact else float
 
         if normal_vector is None:
             all_zeros = ['0']*self.dimension
-            normal_vector = Vector(all_zeros, type=Decimal)
+            normal_vector = Vector(all_zeros, type=self.type)
         self.normal_vector = normal_vector
 
         if constant_term is None:
             constant_term = '0'
-        self.constant_term = Decimal(constant_term)
+        self.constant_term = self.type(constant_term)
 
         self.set_basepoint()
         self.set_direction_vector()
 
     def set_basepoint(self):
+        # Called again after normal_vector or constant_term change, so the
+        # formatted string has to be rebuilt too.
+        self._str_cache = None
         n = self.normal_vector
         c = self.constant_term
         basepoint_coords = ['0']*self.dimension
 
         try:
             initial_index = Line.first_nonzero_index(n)
-            initial_coefficient = n[initial_index]
+            initial_coefficient = self.type(n[initial_index])
             basepoint_coords[initial_index] = c/initial_coefficient
-            self.basepoint = Vector(basepoint_coords, type=Decimal)
+            self.basepoint = Vector(basepoint_coords, type=self.type)
         except NoNonZeroElements:
             self.basepoint = None
 
     def set_direction_vector(self):
+        self._str_cache = None
         n = self.normal_vector
-        self.direction_vector = Vector([-n['x'], n['y']], type=Decimal)
+        self.direction_vector = Vector([-n['x'], n['y']], type=self.type)
 
     def includes_point(self, point):
-        if not isinstance(point, Vector):
-            point = Vector(point, type=Decimal)
+        if not isinstance(point, Vector) or point.type is not self.type:
+            point = Vector(point, type=self.type)
 
         path = point - self.basepoint
         return path.is_parallel(self.direction_vector)
 
     def __repr__(self):
+        if self.type is Decimal:
+            return 'Line({}, {}, exact=True)'.format(repr(self.normal_vector),
+                                                      self.constant_term)
         return 'Line({}, {})'.format(repr(self.normal_vector), self.constant_term)
 
     def __str__(self):
+        if self._str_cache is None:
+            self._str_cache = self._format()
+        return self._str_cache
+
+    def _format(self):
         num_decimal_places = 3
 
         def write_coefficient(coefficient, is_initial_term=False):
@@ -74,12 +127,13 @@ class Line(object):
 
         n = self.normal_vector
 
-        try:
-            initial_index = Line.first_nonzero_index(n)
-            terms = [write_coefficient(n[i], is_initial_term=(i==initial_index)) + 'x_{}'.format(i+1)
-                     for i in range(self.dimension) if round(n[i], num_decimal_places) != 0]
+        active = [(i, coefficient) for i, coefficient in enumerate(n)
+                  if round(coefficient, num_decimal_places) != 0]
+        if active:
+            terms = [write_coefficient(coefficient, is_initial_term=(k==0)) + 'x_{}'.format(i+1)
+                     for k, (i, coefficient) in enumerate(active)]
             output = ' '.join(terms)
-        except NoNonZeroElements:
+        else:
             output = '0'
 
         constant = round(self.constant_term, num_decimal_places)
@@ -91,6 +145,22 @@ class Line(object):
 
     @staticmethod
     def first_nonzero_index(iterable):
+        """
+        >>> Line.first_nonzero_index([0, 1e-11, -2])
+        2
+        >>> Line.first_nonzero_index(Vector([0, 0, 0, 0, 1e-11, 0, 3, 1]))
+        6
+        >>> Line.first_nonzero_index(Vector([0.0] * 6))  # doctest: +IGNORE_EXCEPTION_DETAIL
+        Traceback (most recent call last):
+        ...
+        NoNonZeroElements
+        """
+        if isinstance(iterable, Vector) and iterable.dimension > iterable.SMALL_DIMENSION:
+            magnitudes = np.abs(np.asarray(iterable.coordinates, dtype=float))
+            nonzero = np.flatnonzero(magnitudes >= NEAR_ZERO_EPS)
+            if nonzero.size:
+                return int(nonzero[0])
+            raise NoNonZeroElements()
         for k, item in enumerate(iterable):
             if not is_near_zero(item):
                 return k
@@ -101,5 +171,13 @@ class NoNonZeroElements(Exception):
     pass
 
 
-def is_near_zero(val, eps=1e-10):
+NEAR_ZERO_EPS = 1e-10
+
+
+def is_near_zero(val, eps=NEAR_ZERO_EPS):
     return abs(val) < eps
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
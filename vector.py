@@ -3,13 +3,31 @@ This module implements a linear algebra Vector.
 
 >>> Vector([1,2,3])
 Vector([1, 2, 3])
+
+Vector dispatches on the coordinate type: Decimal vectors are
+DecimalVector instances, all others are FloatVector instances.
+
+>>> type(Vector([1,2,3])).__name__
+'FloatVector'
+>>> type(Vector(['1','2','3'], type=Decimal)).__name__
+'DecimalVector'
 """
 
 import math
 from decimal import Decimal
+from operator import add, mul, sub
 
 import numpy as np
 
+from vector_kernels import dot, norm_squared
+
+# NumPy float dtype that new vectors above Vector.SMALL_DIMENSION convert
+# their coordinates to; None lets NumPy infer it. Smaller vectors, and
+# Decimal vectors of any size, stay plain Python tuples and ignore it.
+# Setting np.float32 halves memory traffic for large vectors, but
+# Vector.TOLERANCE assumes float64 precision.
+DEFAULT_DTYPE = None
+
 
 class Vector():
     """
@@ -22,6 +40,8 @@ class Vector():
     >>> b = Vector([5,5,10])
     >>> a == b
     True
+    >>> Vector([0.1] * 6) == Vector([0.1] * 6)
+    True
 
     Vectors can be created from iterables
     >>> Vector(range(3)).coordinates
@@ -31,45 +51,141 @@ class Vector():
     >>> v = Vector([0,5,10])
     >>> [x for x in v]
     [0, 5, 10]
+
+    Vectors can be copied and pickled
+    >>> import copy, pickle
+    >>> copy.deepcopy(Vector(['1.5', '2'], type=Decimal))
+    Vector(['1.5', '2'], type=Decimal)
+    >>> pickle.loads(pickle.dumps(Vector(range(6)) * 2))
+    Vector([0, 2, 4, 6, 8, 10])
+
+    Vectors above SMALL_DIMENSION can use a narrower float dtype; their
+    coordinates then hold the converted values too, and arithmetic
+    results keep it. Smaller vectors ignore dtype.
+    >>> v = Vector([0.5] * 4 + [0.1], dtype=np.float32)
+    >>> v.coordinates[-1], (v + v)._array.dtype
+    (0.10000000149011612, dtype('float32'))
+    >>> Vector([0.5, 0.1], dtype=np.float32).coordinates
+    [0.5, 0.1]
+    >>> Vector([100] * 6, dtype=np.int8)
+    Traceback (most recent call last):
+    ...
+    ValueError: dtype must be a floating point type
+
+    The DEFAULT_DTYPE switch applies to every new large vector
+    >>> import sys
+    >>> vector_module = sys.modules[Vector.__module__]
+    >>> vector_module.DEFAULT_DTYPE = np.float32
+    >>> Vector([1, 2]) + Vector([3, 4]), Vector([1, 2]) - Vector([3, 4])
+    (Vector([4, 6]), Vector([-2, -2]))
+    >>> (Vector(range(6)) + Vector(range(6)))._array.dtype
+    dtype('float32')
+    >>> vector_module.DEFAULT_DTYPE = None
+
+    Vectors created from an ndarray hold a copy of it
+    >>> a = np.arange(6.0)
+    >>> w = Vector(a)
+    >>> a[0] = 100
+    >>> w.coordinates, w.magnitude_squared
+    ([0.0, 1.0, 2.0, 3.0, 4.0, 5.0], 55.0)
     """
 
+    __slots__ = ('_arr', '_tuple', '_type', '_dtype', '_dim',
+                 '_mag', '_mag_sq', '_norm')
+
     TOLERANCE = 1e-10
+    TOLERANCE_SQUARED = TOLERANCE ** 2
     NORM_ZERO_ERR_MSG = 'cannot normalize the zero vector'
-
-    def __init__(v, coordinates, type=None):
+    # Up to this dimension, arithmetic is done in pure Python on the
+    # coordinate tuples; NumPy dispatch costs more than the math itself.
+    SMALL_DIMENSION = 4
+    _NAMED_COORDINATES = {'x': 0, 'y': 1, 'z': 2}
+
+    def __new__(cls, coordinates, type=None, dtype=None):
+        if cls is Vector:
+            cls = DecimalVector if type is Decimal else FloatVector
+        return object.__new__(cls)
+
+    def __getnewargs_ex__(v):
+        # copy and pickle call __new__ again before restoring the slots,
+        # so it needs the arguments that select the subclass.
+        return (v._coords_tuple,), {'type': v._type}
+
+    def __init__(v, coordinates, type=None, dtype=None):
+        v._type = type
+        v._dtype = DEFAULT_DTYPE if dtype is None else dtype
+        if v._dtype is not None and np.dtype(v._dtype).kind != 'f':
+            raise ValueError('dtype must be a floating point type')
+        v._mag = v._mag_sq = v._norm = None
         if type:
             coordinates = [type(x) for x in coordinates]
-        v._array = np.array(coordinates)
-        v._coordinates = list(coordinates)
-        v._cache = {}
-        v._type = type
+        if not isinstance(coordinates, np.ndarray):
+            coordinates = tuple(coordinates)
+        v._dim = len(coordinates)
+        if v._dim <= v.SMALL_DIMENSION:
+            # Small vectors live on the tuple fast path; dtype does not
+            # apply to them.
+            if isinstance(coordinates, np.ndarray):
+                coordinates = tuple(coordinates.tolist())
+            v._tuple = coordinates
+            v._arr = None
+        else:
+            # Large vectors are array-backed from the start, converted to
+            # dtype if one is set. The coordinates are read back from the
+            # array, so both views agree, and a caller's ndarray is never
+            # aliased.
+            v._arr = np.array(coordinates, dtype=v._dtype)
+            v._tuple = None
+
+    @staticmethod
+    def _from_array(array, type=None):
+        # Results of NumPy arithmetic are fresh arrays owned by nobody else,
+        # so they are kept as-is; the coordinate tuple is only materialized
+        # if someone asks for it.
+        if type:
+            return Vector(array, type=type)
+        v = object.__new__(FloatVector)
+        v._type = None
+        v._dtype = array.dtype
+        v._mag = v._mag_sq = v._norm = None
+        v._arr = array
+        v._tuple = None
+        v._dim = len(array)
+        return v
 
     def __repr__(v):
-        if v._type is Decimal:
-            decs = ["'" + str(dec) + "'" for dec in v._coordinates]
-            coord = '[{}]'.format(', '.join(decs))
-            return 'Vector({}, type=Decimal)'.format(coord)
-        elif v._type:
-            return 'Vector({}, type={})'.format(v._coordinates,
+        if v._type:
+            return 'Vector({}, type={})'.format(v.coordinates,
                                                 v._type.__name__)
         else:
-            return 'Vector({})'.format(v._coordinates)
+            return 'Vector({})'.format(v.coordinates)
 
     def __eq__(v, w):
-        return (v - w).is_zero()
+        if not isinstance(w, Vector) or v._dim != w._dim:
+            return (v - w).is_zero()
+        # Squared distance straight off the coordinates: no difference
+        # Vector and no square root.
+        if v._dim <= v.SMALL_DIMENSION:
+            distance_squared = sum((a - b) * (a - b) for a, b in
+                                   zip(v._coords_tuple, w._coords_tuple))
+        else:
+            difference = v._array - w._array
+            distance_squared = float(difference.dot(difference))
+        return distance_squared < v.TOLERANCE_SQUARED
 
     def __iter__(v):
-        return iter(v._coordinates)
+        return iter(v._coords_tuple)
 
     def __getitem__(v, n):
-        if v.dimension <= 3:
-            if n == 'x':
-                n = 0
-            elif n == 'y':
-                n = 1
-            elif n == 'z':
-                n = 2
-        return v._coordinates[n]
+        """
+        >>> Vector([1,2,3])['y'], Vector([1,2,3])[0:2]
+        (2, [1, 2])
+        """
+        if isinstance(n, str) and v._dim <= 3:
+            n = v._NAMED_COORDINATES.get(n, n)
+        elif isinstance(n, slice):
+            return list(v._coords_tuple[n])
+        return v._coords_tuple[n]
 
     def __add__(v, w):
         """
@@ -80,30 +196,22 @@ class Vector():
         """
         if not isinstance(w, Vector):
             raise TypeError(
-                'unsupported operand type(s) for +: \'%s\' and \'%s\'' %
-                (type(v).__name__, type(w).__name__))
-        elif v.dimension != w.dimension:
+                'unsupported operand type(s) for +: \'Vector\' and \'%s\'' %
+                type(w).__name__)
+        elif v._dim != w._dim:
             raise ValueError('addition undefined on vectors of different dimensions')
+        elif v._dim <= v.SMALL_DIMENSION:
+            return Vector(map(add, v._coords_tuple, w._coords_tuple),
+                          type=v._type if v._type is w._type else None)
         else:
-            return Vector(v._array + w._array, type=v._mix_types(w))
+            return Vector._from_array(v._array + w._array,
+                                      type=v._type if v._type is w._type else None)
 
-    def __mul__(v, n):
-        """
-        Vector-scalar multiplication
-
-        >>> Vector([1,2,3]) * 3
-        Vector([3, 6, 9])
-        """
-        try:
-            if v._type is Decimal:
-                n = Decimal(n)
-            else:
-                float(n)
-        except ValueError:
-            raise TypeError(
-                'unsupported operand type(s) for *: \'%s\' and \'%s\'' %
-                (type(v).__name__, type(n).__name__))
-        return Vector(v._array * n, type=v._type)
+    def _scaled(v, n):
+        # n must already be a valid scalar for this vector's type.
+        if v._dim <= v.SMALL_DIMENSION:
+            return Vector([x * n for x in v._coords_tuple], type=v._type)
+        return Vector._from_array(v._array * n, type=v._type)
 
     def __rmul__(v, n):
         """
@@ -123,15 +231,16 @@ class Vector():
         """
         if not isinstance(w, Vector):
             raise TypeError(
-                'unsupported operand type(s) for -: \'%s\' and \'%s\'' %
-                (type(v).__name__, type(w).__name__))
-        elif v.dimension != w.dimension:
+                'unsupported operand type(s) for -: \'Vector\' and \'%s\'' %
+                type(w).__name__)
+        elif v._dim != w._dim:
             raise ValueError('subtraction undefined on vectors of different dimensions')
+        elif v._dim <= v.SMALL_DIMENSION:
+            return Vector(map(sub, v._coords_tuple, w._coords_tuple),
+                          type=v._type if v._type is w._type else None)
         else:
-            return Vector(v._array - w._array, type=v._mix_types(w))
-
-    def _mix_types(v, w):
-        return ((v._type is w._type) and v._type) or None
+            return Vector._from_array(v._array - w._array,
+                                      type=v._type if v._type is w._type else None)
 
     @property
     def type(v):
@@ -139,7 +248,20 @@ class Vector():
 
     @property
     def coordinates(v):
-        return v._coordinates
+        return list(v._coords_tuple)
+
+    @property
+    def _coords_tuple(v):
+        if v._tuple is None:
+            v._tuple = tuple(v._array.tolist())
+        return v._tuple
+
+    @property
+    def _array(v):
+        # Only built when a large-dimension operation needs NumPy.
+        if v._arr is None:
+            v._arr = np.array(v._tuple)
+        return v._arr
 
     @property
     def dimension(v):
@@ -147,23 +269,26 @@ class Vector():
         >>> Vector([1,2,3]).dimension
         3
         """
-        if 'dimension' not in v._cache:
-            v._cache['dimension'] = len(v.coordinates)
-        return v._cache['dimension']
+        return v._dim
 
     @property
-    def magnitude(v):
+    def magnitude_squared(v):
         """
-        >>> Vector([3, 4]).magnitude
-        5.0
+        >>> Vector([3, 4]).magnitude_squared
+        25
         """
-        if 'magnitude' not in v._cache:
-            if v._type == Decimal:
-                mag = (v._array ** 2).sum().sqrt()
+        if v._mag_sq is None:
+            if v._dim <= v.SMALL_DIMENSION:
+                mag_sq = sum(x * x for x in v._coords_tuple)
+            elif v._array.dtype == np.float64:
+                mag_sq = norm_squared(v._array)
+            elif v._array.dtype.kind == 'f':
+                mag_sq = np.einsum('i,i->', v._array, v._array,
+                                   dtype=_accumulator_dtype(v._array))
             else:
-                mag = math.sqrt((v._array ** 2).sum())
-            v._cache['magnitude'] = mag
-        return v._cache['magnitude']
+                mag_sq = (v._array ** 2).sum()
+            v._mag_sq = mag_sq
+        return v._mag_sq
 
     @property
     def normalized(v):
@@ -173,12 +298,12 @@ class Vector():
         >>> Vector([3,4.6,12.24]).normalized.magnitude
         1.0
         """
-        if 'normalized' not in v._cache:
+        if v._norm is None:
             try:
-                v._cache['normalized'] = v * (1 / v.magnitude)
+                v._norm = v * (1 / v.magnitude)
             except ZeroDivisionError:
                 raise ValueError(v.NORM_ZERO_ERR_MSG)
-        return v._cache['normalized']
+        return v._norm
 
     def inner(v, w):
         """
@@ -187,14 +312,18 @@ class Vector():
         >>> Vector([1,2,3]).inner(Vector([3,2,1]))
         10
         """
-        try:
+        if v._dim != w._dim:
+            raise ValueError(
+                'inner product undefined on vectors of different dimensions')
+        elif v._dim <= v.SMALL_DIMENSION:
+            return sum(map(mul, v._coords_tuple, w._coords_tuple))
+        elif v._array.dtype == w._array.dtype == np.float64:
+            return dot(v._array, w._array)
+        elif v._array.dtype.kind == w._array.dtype.kind == 'f':
+            return np.einsum('i,i->', v._array, w._array,
+                             dtype=_accumulator_dtype(v._array, w._array))
+        else:
             return (v._array * w._array).sum()
-        except ValueError as e:
-            if v.dimension != w.dimension:
-                raise ValueError(
-                    'inner product undefined on vectors of different dimensions')
-            else:
-                raise e
 
     def cross(v, w):
         """
@@ -207,13 +336,15 @@ class Vector():
         >>> b.cross(a)
         Vector([0.0, 0.0, -1.0])
         """
-        if not (v.dimension == w.dimension == 3):
+        if not (v._dim == w._dim == 3):
             raise ValueError(
                 'cross product only defined for 3-dimensional vectors')
+        vx, vy, vz = v._coords_tuple
+        wx, wy, wz = w._coords_tuple
         return Vector([
-           v['y']*w['z'] - w['y']*v['z'],
-           w['x']*v['z'] - v['x']*w['z'],
-           v['x']*w['y'] - w['x']*v['y'],
+           vy*wz - wy*vz,
+           wx*vz - vx*wz,
+           vx*wy - wx*vy,
         ])
 
     def angle(v, w):
@@ -243,21 +374,188 @@ class Vector():
         >>> v.projected(w)
         Vector(['0.5', '0.5'], type=Decimal)
         """
-        return basis * (v.inner(basis) / (basis.magnitude ** 2))
+        # The scale is already of the right type, so skip the scalar
+        # checks in __mul__.
+        return basis._scaled(v.inner(basis) / basis.magnitude_squared)
 
     def is_zero(v):
-        return v.magnitude < v.TOLERANCE
+        return v.magnitude_squared < v.TOLERANCE_SQUARED
 
     def is_orthogonal(v, w):
+        """
+        Only the inner product is needed, so no magnitude (and no
+        Decimal.sqrt) is ever computed.
+
+        >>> v = Vector(['1', '2'], type=Decimal)
+        >>> v.is_orthogonal(Vector(['-2', '1'], type=Decimal))
+        True
+        """
         return abs(v.inner(w)) < v.TOLERANCE
 
     def is_parallel(v, w):
-        return (
-            v.is_zero() or
-            w.is_zero() or
-            v.normalized == w.normalized or
-            v.normalized * -1 == w.normalized
-        )
+        """
+        v and w are parallel if the sine of the angle between them is
+        within tolerance of zero; in 2-D and 3-D this is tested on the
+        cross product, otherwise on the rejection of w from v. Neither
+        vector is normalized.
+
+        >>> Vector([1, 2]).is_parallel(Vector([-2, -4]))
+        True
+        >>> Vector([1, 2, 3]).is_parallel(Vector([1, 2, 4]))
+        False
+        >>> Vector([1, 2, 3, 4]).is_parallel(Vector([0.5, 1, 1.5, 2]))
+        True
+        """
+        if v._dim != w._dim:
+            raise ValueError(
+                'parallelism undefined on vectors of different dimensions')
+        if v.is_zero() or w.is_zero():
+            return True
+        if v._dim == 2:
+            (v0, v1), (w0, w1) = v._coords_tuple, w._coords_tuple
+            det = v0*w1 - v1*w0
+            cross_squared = det * det
+        elif v._dim == 3:
+            cross_squared = v.cross(w).magnitude_squared
+        else:
+            # (v.w)^2 = |v|^2 |w|^2 exactly when v || w, but taking that
+            # difference directly cancels catastrophically in floats;
+            # measure the part of w orthogonal to v instead.
+            rejection = w - w.projected(v)
+            return (rejection.magnitude_squared / w.magnitude_squared <
+                    v.TOLERANCE_SQUARED)
+        sine_squared = cross_squared / (v.magnitude_squared * w.magnitude_squared)
+        return sine_squared < v.TOLERANCE_SQUARED
+
+    @staticmethod
+    def inner_batch(A, B, dtype=None):
+        """
+        Row-wise inner products of two (N, D) arrays of coordinates,
+        optionally computed in the given dtype
+
+        >>> Vector.inner_batch([[1, 2, 3], [1, 0, 0]], [[3, 2, 1], [0, 1, 0]])
+        array([10,  0])
+        >>> A = np.array([[3, 4]], dtype=np.float32)
+        >>> Vector.inner_batch(A, A, dtype=np.float64)
+        array([25.])
+        """
+        return np.einsum('ij,ij->i', A, B, dtype=dtype)
+
+    @staticmethod
+    def magnitude_batch(A, dtype=None):
+        """
+        Row-wise magnitudes of an (N, D) array of coordinates,
+        optionally computed in the given dtype
+
+        >>> Vector.magnitude_batch([[3, 4], [5, 12]])
+        array([ 5., 13.])
+        """
+        return np.sqrt(np.einsum('ij,ij->i', A, A, dtype=dtype))
+
+    @staticmethod
+    def cross_batch(A, B):
+        """
+        Row-wise cross products of two (N, 3) arrays of coordinates
+
+        >>> Vector.cross_batch([[1, 0, 0], [0, 1, 0]], [[0, 1, 0], [1, 0, 0]])
+        array([[ 0,  0,  1],
+               [ 0,  0, -1]])
+        """
+        return np.cross(A, B, axis=-1)
+
+
+class FloatVector(Vector):
+    """
+    A Vector of Python or NumPy numbers (anything but Decimal).
+    """
+
+    __slots__ = ()
+
+    def __mul__(v, n):
+        """
+        Vector-scalar multiplication
+
+        >>> Vector([1,2,3]) * 3
+        Vector([3, 6, 9])
+        >>> Vector([1,2,3]) * 'a'
+        Traceback (most recent call last):
+        ...
+        TypeError: unsupported operand type(s) for *: 'Vector' and 'str'
+        """
+        try:
+            float(n)
+        except ValueError:
+            raise TypeError(
+                'unsupported operand type(s) for *: \'Vector\' and \'%s\'' %
+                type(n).__name__)
+        return v._scaled(n)
+
+    @property
+    def magnitude(v):
+        """
+        >>> Vector([3, 4]).magnitude
+        5.0
+        >>> Vector([3e300, 4e300]).magnitude
+        5e+300
+        """
+        if v._mag is None:
+            if v._dim <= v.SMALL_DIMENSION:
+                # hypot avoids squaring, so it cannot overflow or underflow
+                v._mag = math.hypot(*v._coords_tuple)
+            else:
+                v._mag = math.sqrt(v.magnitude_squared)
+        return v._mag
+
+
+class DecimalVector(Vector):
+    """
+    A Vector of Decimal coordinates.
+
+    >>> Vector(['0.1', '0.2'], type=Decimal) * 3
+    Vector(['0.3', '0.6'], type=Decimal)
+    >>> v = Vector(['0.1'] * 8, type=Decimal)
+    >>> v.inner(v)
+    Decimal('0.08')
+    >>> v._arr is None
+    True
+    """
+
+    __slots__ = ()
+
+    # An object-dtype ndarray of Decimals does the same per-element Python
+    # arithmetic as a tuple with NumPy dispatch on top, so Decimal vectors
+    # of every dimension stay on the tuple path and never build an array.
+    SMALL_DIMENSION = math.inf
+
+    def __repr__(v):
+        decs = ["'" + str(dec) + "'" for dec in v._coords_tuple]
+        coord = '[{}]'.format(', '.join(decs))
+        return 'Vector({}, type=Decimal)'.format(coord)
+
+    def __mul__(v, n):
+        try:
+            n = Decimal(n)
+        except ValueError:
+            raise TypeError(
+                'unsupported operand type(s) for *: \'Vector\' and \'%s\'' %
+                type(n).__name__)
+        return v._scaled(n)
+
+    @property
+    def magnitude(v):
+        """
+        >>> Vector(['3', '4'], type=Decimal).magnitude
+        Decimal('5')
+        """
+        if v._mag is None:
+            v._mag = v.magnitude_squared.sqrt()
+        return v._mag
+
+
+def _accumulator_dtype(*arrays):
+    # Narrow floats (e.g. float32 from DEFAULT_DTYPE) are stored compactly
+    # but summed in at least float64.
+    return np.promote_types(np.result_type(*arrays), np.float64)
 
 
 def area_of_parallelogram(v, w):
@@ -286,6 +584,13 @@ def exercises():
     print('area of triangle spanned by {} and {} is {}\n'
           .format(v, w, area_of_triangle(v, w)))
 
+    # Batched operations over stacked coordinates
+    A = np.array([[8.462, 7.893, -8.187], [-8.987, -9.838, 5.031]])
+    B = np.array([[6.984, -5.975, 4.778], [-4.268, -1.861, -8.866]])
+    print('row-wise inner products are {}\n'.format(V.inner_batch(A, B)))
+    print('areas of parallelograms are {}\n'
+          .format(V.magnitude_batch(V.cross_batch(A, B))))
+
 
 if __name__ == '__main__':
     exercises()
@@ -0,0 +1,54 @@
+"""
+This module implements compiled kernels for the float64 Vector paths.
+
+The kernels are compiled with Numba when it is installed; otherwise they
+fall back to the equivalent NumPy calls.
+
+>>> import numpy as np
+>>> dot(np.array([1.0, 2.0, 3.0]), np.array([3.0, 2.0, 1.0]))
+10.0
+>>> norm_squared(np.array([3.0, 4.0]))
+25.0
+
+Read-only and non-contiguous arrays are accepted too.
+
+>>> ones = np.broadcast_to(1.0, (6,))
+>>> dot(ones, ones), norm_squared(np.arange(12.0)[::4])
+(6.0, 80.0)
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+if njit is not None:
+    # No explicit signature: Numba specializes on layout and on read-only
+    # arrays (e.g. from np.broadcast_to) as they come in.
+    @njit(cache=True, fastmath=True)
+    def dot(a, b):
+        total = 0.0
+        for i in range(a.shape[0]):
+            total += a[i] * b[i]
+        return total
+
+    @njit(cache=True, fastmath=True)
+    def norm_squared(a):
+        total = 0.0
+        for i in range(a.shape[0]):
+            total += a[i] * a[i]
+        return total
+else:
+    def dot(a, b):
+        return float(np.dot(a, b))
+
+    def norm_squared(a):
+        return float(np.dot(a, a))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()